@@ -1,9 +1,12 @@
+import io
 import os
 import sys
+import sqlite3
 import subprocess
+import threading
 import pandas as pd
 import streamlit as st
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 import matplotlib.pyplot as plt
 import calendar
 
@@ -11,48 +14,186 @@ import calendar
 st.set_page_config(page_title="CMS Excel", layout="wide")
 
 # --- Auto-install dependency ---
-try:
-    import openpyxl
-except ModuleNotFoundError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "openpyxl"])
-    import openpyxl
+@st.cache_resource
+def ensure_dependencies():
+    # Checked once per process rather than on every rerun
+    try:
+        import openpyxl
+        import lxml  # lets openpyxl's write-only mode use the fast serializer
+    except ModuleNotFoundError:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "openpyxl", "lxml"])
 
-# --- Excel setup ---
-FILE_PATH = "cms_data.xlsx"
+ensure_dependencies()
+import openpyxl
 
-def init_excel():
-    if not os.path.exists(FILE_PATH):
-        with pd.ExcelWriter(FILE_PATH, engine='openpyxl') as writer:
-            pd.DataFrame(columns=["client_id","full_name","phone","email","address","notes"]).to_excel(writer, sheet_name="clients", index=False)
-            pd.DataFrame(columns=["order_id","client_id","service_type","weight_count","pickup_date","due_date","status","special_instructions","delivery_fee","total_fee"]).to_excel(writer, sheet_name="orders", index=False)
-            pd.DataFrame(columns=["payment_id","order_id","amount_paid","payment_date","payment_method","payment_status","notes"]).to_excel(writer, sheet_name="payments", index=False)
-            pd.DataFrame(columns=["expense_id","date_incurred","category","description","amount","fixed_variable","notes"]).to_excel(writer, sheet_name="costs", index=False)
+# --- Database setup ---
+DB_PATH = "cms.db"
+FILE_PATH = "cms_data.xlsx"
 
-def load_data(sheet):
-    try:
-        return pd.read_excel(FILE_PATH, sheet_name=sheet)
-    except Exception:
+SCHEMA = {
+    "clients": [("client_id","INTEGER PRIMARY KEY"),("full_name","TEXT"),("phone","TEXT"),("email","TEXT"),("address","TEXT"),("notes","TEXT")],
+    "orders": [("order_id","INTEGER PRIMARY KEY"),("client_id","INTEGER"),("service_type","TEXT"),("weight_count","REAL"),("pickup_date","TEXT"),("due_date","TEXT"),("status","TEXT"),("special_instructions","TEXT"),("delivery_fee","REAL"),("total_fee","REAL")],
+    "payments": [("payment_id","INTEGER PRIMARY KEY"),("order_id","INTEGER"),("amount_paid","REAL"),("payment_date","TEXT"),("payment_method","TEXT"),("payment_status","TEXT"),("notes","TEXT")],
+    "costs": [("expense_id","INTEGER PRIMARY KEY"),("date_incurred","TEXT"),("category","TEXT"),("description","TEXT"),("amount","REAL"),("fixed_variable","TEXT"),("notes","TEXT")],
+}
+
+DATE_COLUMNS = {"orders": "due_date", "payments": "payment_date", "costs": "date_incurred"}
+
+# Narrower dtypes for ids and counts; money columns stay float64 so totals keep their precision
+DTYPES = {
+    "clients": {"client_id": "Int32"},
+    "orders": {"order_id": "Int32", "client_id": "Int32", "weight_count": "float32"},
+    "payments": {"payment_id": "Int32", "order_id": "Int32"},
+    "costs": {"expense_id": "Int32"},
+}
+
+@st.cache_resource
+def get_db():
+    # One connection per process, shared across reruns and sessions behind a lock
+    return sqlite3.connect(DB_PATH, check_same_thread=False), threading.Lock()
+
+conn, db_lock = get_db()
+
+def _import_excel():
+    for table, df in pd.read_excel(FILE_PATH, sheet_name=None).items():
+        if table not in SCHEMA:
+            continue
+        cols = [c for c, _ in SCHEMA[table] if c in df.columns]
+        df = df[cols]
+        for col in df.select_dtypes("datetime").columns:
+            df[col] = df[col].dt.strftime("%Y-%m-%d")
+        df = df.astype(object).where(df.notna(), None)
+        conn.executemany(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                         [[_sql_value(v) for v in row] for row in df.itertuples(index=False, name=None)])
+
+@st.cache_resource
+def init_db():
+    # Tables and the first-run Excel import share one transaction; user_version marks it as done,
+    # so a failed import rolls back completely and is retried on the next start
+    with db_lock, conn:
+        conn.execute("BEGIN")
+        for table, columns in SCHEMA.items():
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{c} {t}' for c, t in columns)})")
+        if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+            if os.path.exists(FILE_PATH):
+                _import_excel()
+            conn.execute("PRAGMA user_version = 1")
+
+def file_mtime():
+    return os.path.getmtime(DB_PATH) if os.path.exists(DB_PATH) else 0
+
+def _read_table(table):
+    if table not in SCHEMA:
         return pd.DataFrame()
+    df = pd.read_sql_query(f"SELECT * FROM {table}", conn, dtype=DTYPES[table])
+    # Parse dates once here so the cached frame already carries typed columns
+    if table in DATE_COLUMNS:
+        col = DATE_COLUMNS[table]
+        df[col] = pd.to_datetime(df[col], format="ISO8601", errors="coerce", cache=True)
+        if table == "orders":
+            df[col] = df[col].dt.date
+    return df
+
+# mtime is part of the cache key so any change on disk invalidates the cached frames
+@st.cache_data(show_spinner=False)
+def _read_sheet(sheet, mtime):
+    with db_lock:
+        return _read_table(sheet)
+
+@st.cache_data(show_spinner=False)
+def _read_all(mtime):
+    with db_lock:
+        return {table: _read_table(table) for table in SCHEMA}
 
-def save_data(sheet, df):
-    with pd.ExcelWriter(FILE_PATH, mode='a', engine='openpyxl', if_sheet_exists='replace') as writer:
-        df.to_excel(writer, sheet_name=sheet, index=False)
+def load_data(sheet):
+    return _read_sheet(sheet, file_mtime())
+
+@st.cache_data(show_spinner=False)
+def _read_monthly(mtime):
+    sheets = _read_all(mtime)
+    payments, costs = sheets["payments"], sheets["costs"]
+    monthly_rev = payments.groupby(payments["payment_date"].dt.to_period("M"), sort=True)["amount_paid"].sum()
+    monthly_cost = costs.groupby(costs["date_incurred"].dt.to_period("M"), sort=True)["amount"].sum()
+    return monthly_rev, monthly_cost
+
+def load_all():
+    return _read_all(file_mtime())
+
+def load_monthly_totals():
+    # Revenue and cost per month, cached alongside the tables they are built from
+    return _read_monthly(file_mtime())
+
+def clear_cache():
+    _read_sheet.clear()
+    _read_all.clear()
+    _read_monthly.clear()
+
+def _sql_value(value):
+    # sqlite3 cannot bind numpy scalars, unwrap them to plain Python values
+    return value.item() if hasattr(value, "item") else value
+
+def execute(sql, params=()):
+    with db_lock, conn:
+        conn.execute(sql, [_sql_value(v) for v in params])
+    clear_cache()
+
+# New rows leave out their id column: SQLite fills an omitted INTEGER PRIMARY KEY
+# with MAX(id)+1 inside the insert itself, so concurrent submissions cannot collide
+def add_rows(sheet, rows):
+    # Insert a batch in one transaction and invalidate the cache once
+    rows = list(rows)
+    if not rows:
+        return
+    cols = list(rows[0])
+    with db_lock, conn:
+        conn.executemany(f"INSERT INTO {sheet} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                         [[_sql_value(row[c]) for c in cols] for row in rows])
+    clear_cache()
 
 def add_row(sheet, new_row):
-    df = load_data(sheet)
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    save_data(sheet, df)
-
-def next_id(df, id_col):
-    return int(df[id_col].max()) + 1 if not df.empty else 1
+    add_rows(sheet, [new_row])
+
+def update_row(sheet, id_col, row_id, changes):
+    assignments = ", ".join(f"{col} = ?" for col in changes)
+    execute(f"UPDATE {sheet} SET {assignments} WHERE {id_col} = ?", [*changes.values(), row_id])
+
+def delete_rows(sheet, col, values):
+    values = list(values)
+    if values:
+        execute(f"DELETE FROM {sheet} WHERE {col} IN ({', '.join('?' * len(values))})", values)
+
+def delete_client(client_id):
+    # Cascade to the client's orders and their payments in one transaction
+    client_id = _sql_value(client_id)
+    with db_lock, conn:
+        conn.execute("DELETE FROM payments WHERE order_id IN (SELECT order_id FROM orders WHERE client_id = ?)", (client_id,))
+        conn.execute("DELETE FROM orders WHERE client_id = ?", (client_id,))
+        conn.execute("DELETE FROM clients WHERE client_id = ?", (client_id,))
+    clear_cache()
+
+def export_excel():
+    # Stream rows straight from SQLite into a write-only workbook
+    wb = openpyxl.Workbook(write_only=True)
+    with db_lock:
+        for table in SCHEMA:
+            ws = wb.create_sheet(table)
+            cursor = conn.execute(f"SELECT * FROM {table}")
+            ws.append([col[0] for col in cursor.description])
+            for row in cursor:
+                ws.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
 
 def sql_date(dt):
-    return dt.strftime("%Y-%m-%d") if isinstance(dt, (date, datetime)) else str(dt)
+    # Callers pass datetime.date values from st.date_input; isoformat gives YYYY-MM-DD
+    return dt.isoformat()
+
+# Keyed by the exact options of the Service selectbox in the Orders form
+SERVICE_RATE = {"WDF (Wash, Dry, Fold)":500,"WDI (Wash, Dry, Iron)":700,"Iron Only":200,"Bedding":1200}
 
 def calculate_fee(service, weight, delivery):
-    rates = {"WDF":500,"WDI":700,"Iron Only":200,"Bedding":1200}
-    rate = next((v for k,v in rates.items() if service.startswith(k)), 500)
-    return rate * (weight or 0) + (delivery or 0)
+    return SERVICE_RATE.get(service, 500) * (weight or 0) + (delivery or 0)
 
 # --- Style ---
 st.markdown("""
@@ -78,27 +219,33 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- Init Excel ---
-init_excel()
+# --- Init database ---
+try:
+    init_db()
+except Exception as e:
+    st.error(f"⚠️ Could not import {FILE_PATH} into the database, nothing was saved: {e}")
+    st.stop()
 
 # --- Sidebar ---
 st.sidebar.title("📘 CMS Menu")
 page = st.sidebar.radio("Navigate to", ["Overview","Clients","Client Profile","Orders","Payments & Costs","Calendar","Dashboard"])
 
+if st.sidebar.button("📤 Export to Excel"):
+    st.sidebar.download_button("⬇️ Download cms_data.xlsx", export_excel(), file_name=FILE_PATH,
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
 # --- Overview ---
 if page == "Overview":
     st.title("📊 Wash & Wear CMS Overview")
 
-    clients = load_data("clients")
-    orders = load_data("orders")
-    payments = load_data("payments")
-    costs = load_data("costs")
+    sheets = load_all()
+    clients, orders, payments, costs = sheets["clients"], sheets["orders"], sheets["payments"], sheets["costs"]
 
     total_revenue = payments["amount_paid"].sum() if not payments.empty else 0
     total_costs = costs["amount"].sum() if not costs.empty else 0
     total_profit = total_revenue - total_costs
-    pending_orders = len(orders[orders["status"] != "Completed"]) if not orders.empty else 0
-    completed_orders = len(orders[orders["status"] == "Completed"]) if not orders.empty else 0
+    completed_orders = int((orders["status"] == "Completed").sum()) if not orders.empty else 0
+    pending_orders = len(orders) - completed_orders
     outstanding_balance = (orders["total_fee"].sum() - total_revenue) if not orders.empty else 0
 
     # --- Top metrics ---
@@ -117,19 +264,26 @@ if page == "Overview":
     # --- Financial Summary Chart ---
     if total_revenue > 0 or total_costs > 0:
         st.subheader("💰 Financial Summary")
-        fig, ax = plt.subplots()
-        ax.bar(["Revenue", "Costs", "Profit"], [total_revenue, total_costs, total_profit],
-               color=["#4caf50", "#f44336", "#1976d2"])
-        ax.set_title("Revenue vs Costs")
-        ax.set_ylabel("Amount (FCFA)")
-        st.pyplot(fig)
+        st.caption("Revenue vs Costs")
+        # st.bar_chart has no per-bar colour option, so each measure gets its own column
+        # filled only on its own bar, which lets `color` give every bar a distinct colour
+        labels = ["Revenue", "Costs", "Profit"]
+        amounts = [total_revenue, total_costs, total_profit]
+        summary = pd.DataFrame({label: [amount if label == row else None for row in labels]
+                                for label, amount in zip(labels, amounts)}, index=labels)
+        st.bar_chart(summary, sort=False, y_label="Amount (FCFA)",
+                     color=["#4caf50", "#f44336", "#1976d2"])
     else:
         st.info("No financial data available yet.")
 
     # --- Top Clients ---
     if not payments.empty and not orders.empty and not clients.empty:
-        merged = payments.merge(orders, on="order_id").merge(clients, on="client_id")
-        top_clients = merged.groupby("full_name")["amount_paid"].sum().nlargest(5)
+        # Map totals through order -> client -> name instead of joining the three tables
+        paid_by_order = payments.groupby("order_id", sort=False)["amount_paid"].sum()
+        client_names = clients.set_index("client_id")["full_name"]
+        paid = orders.assign(paid=orders["order_id"].map(paid_by_order),
+                             full_name=orders["client_id"].map(client_names)).dropna(subset=["paid"])
+        top_clients = paid.groupby("full_name", sort=False)["paid"].sum().rename("amount_paid").nlargest(5)
         st.subheader("💎 Top 5 Clients")
         st.bar_chart(top_clients)
     else:
@@ -137,7 +291,6 @@ if page == "Overview":
 
     # --- Upcoming Deliveries ---
     if not orders.empty:
-        orders["due_date"] = pd.to_datetime(orders["due_date"], errors="coerce").dt.date
         upcoming = orders[orders["due_date"] <= date.today() + timedelta(days=7)]
         st.subheader("📅 Upcoming Deliveries (Next 7 Days)")
         if not upcoming.empty:
@@ -164,8 +317,7 @@ elif page == "Clients":
         address = st.text_area("Address")
         notes = st.text_area("Notes")
         if st.form_submit_button("Add Client"):
-            cid = next_id(df, "client_id")
-            add_row("clients", {"client_id":cid,"full_name":name,"phone":phone,"email":email,"address":address,"notes":notes})
+            add_row("clients", {"full_name":name,"phone":phone,"email":email,"address":address,"notes":notes})
             st.success("✅ Client added successfully!")
             df = load_data("clients")
 
@@ -177,18 +329,8 @@ elif page == "Clients":
         client_to_delete = st.selectbox("Select Client to Delete", df["full_name"])
         confirm = st.checkbox(f"Confirm deletion of {client_to_delete}")
         if st.button("Delete Client") and confirm:
-            client_id = df[df["full_name"]==client_to_delete]["client_id"].values[0]
-            df = df[df["client_id"] != client_id]
-            save_data("clients", df)
-            orders = load_data("orders")
-            payments = load_data("payments")
-            if not orders.empty:
-                client_orders = orders[orders["client_id"]==client_id]
-                orders = orders[orders["client_id"]!=client_id]
-                save_data("orders", orders)
-                if not payments.empty and not client_orders.empty:
-                    payments = payments[~payments["order_id"].isin(client_orders["order_id"])]
-                    save_data("payments", payments)
+            client_id = int(df.loc[df["full_name"].values == client_to_delete, "client_id"].iat[0])
+            delete_client(client_id)
             st.success(f"✅ Client '{client_to_delete}' and associated orders/payments deleted!")
             df = load_data("clients")
 
@@ -196,25 +338,25 @@ elif page == "Clients":
 elif page == "Client Profile":
     st.header("👤 Client Profile & History")
 
-    clients = load_data("clients")
-    orders = load_data("orders")
-    payments = load_data("payments")
+    sheets = load_all()
+    clients, orders, payments = sheets["clients"], sheets["orders"], sheets["payments"]
 
     if clients.empty:
         st.info("No clients available. Add clients first.")
     else:
+        # Index by name once; first match wins, as with a filtered .iloc[0]
+        name_index = clients.drop_duplicates("full_name").set_index("full_name")
         client_name = st.selectbox("Select Client", clients["full_name"])
-        client_data = clients[clients["full_name"] == client_name].iloc[0]
 
         st.subheader(f"Contact Info for {client_name}")
         st.write({
-            "Phone": client_data["phone"],
-            "Email": client_data["email"],
-            "Address": client_data["address"],
-            "Notes": client_data["notes"]
+            "Phone": name_index.at[client_name, "phone"],
+            "Email": name_index.at[client_name, "email"],
+            "Address": name_index.at[client_name, "address"],
+            "Notes": name_index.at[client_name, "notes"]
         })
 
-        client_orders = orders[orders["client_id"] == client_data["client_id"]]
+        client_orders = orders[orders["client_id"] == name_index.at[client_name, "client_id"]]
         client_payments = payments.merge(client_orders[["order_id"]], on="order_id", how="right")
 
         total_spent = client_payments["amount_paid"].sum() if not client_payments.empty else 0
@@ -237,13 +379,14 @@ elif page == "Client Profile":
 elif page == "Orders":
     st.header("📦 Orders")
 
-    clients = load_data("clients")
-    orders = load_data("orders")
+    sheets = load_all()
+    clients, orders = sheets["clients"], sheets["orders"]
+    name_index = clients.drop_duplicates("full_name").set_index("full_name")
 
     # --- Add Order Form ---
     with st.form("add_order"):
         client = st.selectbox("Client", clients["full_name"] if not clients.empty else [])
-        service = st.selectbox("Service", ["WDF (Wash, Dry, Fold)", "WDI (Wash, Dry, Iron)", "Iron Only", "Bedding"])
+        service = st.selectbox("Service", list(SERVICE_RATE))
         weight = st.number_input("Weight (kg)", min_value=0.0)
         pickup = st.date_input("Pickup Date", value=date.today())
         due = st.date_input("Due Date", value=date.today() + timedelta(days=2))
@@ -256,11 +399,9 @@ elif page == "Orders":
             if clients.empty:
                 st.error("⚠️ Please add clients first.")
             else:
-                cid = int(clients.loc[clients["full_name"] == client, "client_id"].values[0])
-                oid = next_id(orders, "order_id")
+                cid = int(name_index.at[client, "client_id"])
 
                 add_row("orders", {
-                    "order_id": oid,
                     "client_id": cid,
                     "service_type": service,
                     "weight_count": weight,
@@ -277,8 +418,8 @@ elif page == "Orders":
     st.subheader("Existing Orders")
 
     if not orders.empty and not clients.empty:
-        # Merge client names for better readability
-        merged_orders = orders.merge(clients[["client_id", "full_name"]], on="client_id", how="left")
+        # Map client names in for better readability
+        merged_orders = orders.assign(full_name=orders["client_id"].map(clients.set_index("client_id")["full_name"]))
         st.dataframe(merged_orders, use_container_width=True)
 
         # --- Update Order Status ---
@@ -288,20 +429,19 @@ elif page == "Orders":
 
         order_choice = st.selectbox("Select Order", client_orders["order_id"].astype(str) + " - " + client_orders["service_type"])
         selected_order_id = int(order_choice.split(" - ")[0])
-        selected_order = client_orders[client_orders["order_id"] == selected_order_id].iloc[0]
+        selected_status = client_orders.set_index("order_id").at[selected_order_id, "status"]
 
-        st.write(f"**Current Status:** {selected_order['status']}")
+        st.write(f"**Current Status:** {selected_status}")
         new_status = st.selectbox(
             "New Status",
             ["Scheduled Pickup", "Processing", "Ready", "Completed"],
-            index=["Scheduled Pickup", "Processing", "Ready", "Completed"].index(selected_order["status"])
-            if selected_order["status"] in ["Scheduled Pickup", "Processing", "Ready", "Completed"]
+            index=["Scheduled Pickup", "Processing", "Ready", "Completed"].index(selected_status)
+            if selected_status in ["Scheduled Pickup", "Processing", "Ready", "Completed"]
             else 0
         )
 
         if st.button("✅ Update Status"):
-            orders.loc[orders["order_id"] == selected_order_id, "status"] = new_status
-            save_data("orders", orders)
+            update_row("orders", "order_id", selected_order_id, {"status": new_status})
             st.success(f"Order for {client_choice} updated to '{new_status}'!")
 
         # --- Delete Order ---
@@ -315,12 +455,8 @@ elif page == "Orders":
         confirm_del = st.checkbox(f"Confirm deletion of {del_order_choice}")
         if st.button("🗑️ Delete Selected Order") and confirm_del:
             # Delete order and linked payments
-            orders = orders[orders["order_id"] != del_order_id]
-            save_data("orders", orders)
-
-            payments = load_data("payments")
-            payments = payments[payments["order_id"] != del_order_id]
-            save_data("payments", payments)
+            delete_rows("orders", "order_id", [del_order_id])
+            delete_rows("payments", "order_id", [del_order_id])
 
             st.success(f"✅ Order {del_order_choice} for {del_client} deleted successfully!")
     else:
@@ -331,9 +467,8 @@ elif page == "Orders":
 elif page == "Payments & Costs":
     st.header("💰 Payments & Costs")
 
-    orders = load_data("orders")
-    payments = load_data("payments")
-    costs = load_data("costs")
+    sheets = load_all()
+    orders, payments, costs = sheets["orders"], sheets["payments"], sheets["costs"]
 
     # --- Add Payment ---
     with st.form("add_payment"):
@@ -345,9 +480,7 @@ elif page == "Payments & Costs":
         notes = st.text_area("Notes")
 
         if st.form_submit_button("Add Payment"):
-            pid = next_id(payments, "payment_id")
             add_row("payments", {
-                "payment_id": pid,
                 "order_id": order_choice,
                 "amount_paid": amt,
                 "payment_date": sql_date(pay_date),
@@ -355,6 +488,7 @@ elif page == "Payments & Costs":
                 "payment_status": status,
                 "notes": notes
             })
+            payments = load_data("payments")
             st.success("✅ Payment recorded!")
 
     # --- Delete Payment ---
@@ -364,8 +498,8 @@ elif page == "Payments & Costs":
         confirm_payment = st.checkbox(f"Confirm deletion of Payment ID {payment_to_delete}")
 
         if st.button("Delete Payment") and confirm_payment:
+            delete_rows("payments", "payment_id", [payment_to_delete])
             payments = payments[payments["payment_id"] != payment_to_delete]
-            save_data("payments", payments)
             st.success(f"✅ Payment {payment_to_delete} deleted!")
 
     # --- Add Cost ---
@@ -381,9 +515,7 @@ elif page == "Payments & Costs":
         notes = st.text_area("Notes")
 
         if st.form_submit_button("Add Cost"):
-            eid = next_id(costs, "expense_id")
             add_row("costs", {
-                "expense_id": eid,
                 "date_incurred": sql_date(d),
                 "category": cat,
                 "description": desc,
@@ -391,20 +523,21 @@ elif page == "Payments & Costs":
                 "fixed_variable": fv,
                 "notes": notes
             })
+            costs = load_data("costs")
             st.success("✅ Cost added!")
 
     st.subheader("Payments")
-    st.dataframe(load_data("payments"), use_container_width=True)
+    st.dataframe(payments, use_container_width=True)
 
     st.subheader("Costs")
-    st.dataframe(load_data("costs"), use_container_width=True)
+    st.dataframe(costs, use_container_width=True)
 
 # --- Calendar ---
 elif page == "Calendar":
     st.header("🗓️ Enhanced Delivery Calendar")
 
-    orders = load_data("orders")
-    clients = load_data("clients")
+    sheets = load_all()
+    orders, clients = sheets["orders"], sheets["clients"]
 
     if not orders.empty and not clients.empty:
         # Merge client names into orders
@@ -418,8 +551,6 @@ elif page == "Calendar":
                 st.session_state["cal_year"] = date.today().year
             if "cal_month" not in st.session_state:
                 st.session_state["cal_month"] = date.today().month
-            if "selected_date" not in st.session_state:
-                st.session_state["selected_date"] = None
 
             # --- Month navigation ---
             col1, col2, col3 = st.columns([1, 2, 1])
@@ -438,50 +569,67 @@ elif page == "Calendar":
                 st.session_state["cal_year"] += 1
 
             # --- Calendar rendering ---
-            orders["due_date"] = pd.to_datetime(orders["due_date"], errors="coerce").dt.date
             today = date.today()
             cal = calendar.Calendar(firstweekday=0)
             month_days = cal.monthdayscalendar(st.session_state["cal_year"], st.session_state["cal_month"])
 
+            # Group orders by day once so each calendar cell is a dict lookup
+            day_groups = {d: g for d, g in orders.groupby("due_date", sort=False)}
+            day_summary = orders.assign(
+                completed=orders["status"] == "Completed",
+                in_progress=orders["status"].isin(["Scheduled Pickup", "Processing"]),
+            ).groupby("due_date", sort=False).agg(
+                count=("order_id", "size"),
+                all_completed=("completed", "all"),
+                any_in_progress=("in_progress", "any"),
+            ).to_dict("index")
+
+            # --- Build the whole month as one CSS grid ---
+            year, month = st.session_state["cal_year"], st.session_state["cal_month"]
+            cells = [f"<div style='text-align:center;font-weight:bold'>{name}</div>" for name in calendar.day_abbr]
             for week in month_days:
-                cols = st.columns(7)
-                for i, day in enumerate(week):
+                for day in week:
                     if day == 0:
-                        cols[i].markdown(
-                            "<div style='background:#eceff1;height:80px;border-radius:6px'></div>",
-                            unsafe_allow_html=True
-                        )
-                    else:
-                        this_date = date(st.session_state["cal_year"], st.session_state["cal_month"], day)
-                        day_orders = orders[orders["due_date"] == this_date]
-
-                        # --- Color logic based on order status ---
-                        if not day_orders.empty:
-                            if all(day_orders["status"] == "Completed"):
-                                color = "#4caf50"  # Green
-                            elif any(day_orders["status"].isin(["Scheduled Pickup", "Processing"])):
-                                color = "#ffeb3b"  # Yellow
-                            elif this_date < today and any(day_orders["status"] != "Completed"):
-                                color = "#f44336"  # Red
-                            else:
-                                color = "#90caf9"  # Blue
+                        cells.append("<div style='background:#eceff1;height:80px;border-radius:6px'></div>")
+                        continue
+
+                    this_date = date(year, month, day)
+                    stats = day_summary.get(this_date)
+
+                    # --- Color logic based on order status ---
+                    if stats:
+                        if stats["all_completed"]:
+                            color = "#4caf50"  # Green
+                        elif stats["any_in_progress"]:
+                            color = "#ffeb3b"  # Yellow
+                        elif this_date < today:
+                            color = "#f44336"  # Red
                         else:
-                            color = "#eceff1"  # Gray (no orders)
-
-                        # --- Calendar day button ---
-                        if cols[i].button(f"{day}\n📦 {len(day_orders)}", key=f"cal-{this_date}"):
-                            st.session_state["selected_date"] = this_date
+                            color = "#90caf9"  # Blue
+                    else:
+                        color = "#eceff1"  # Gray (no orders)
 
-                        cols[i].markdown(
-                            f"<div style='background:{color};height:40px;border-radius:6px;margin-top:2px'></div>",
-                            unsafe_allow_html=True
-                        )
+                    cells.append(
+                        f"<div style='background:{color};height:80px;border-radius:6px;padding:6px'>"
+                        f"<b>{day}</b><br>📦 {stats['count'] if stats else 0}</div>"
+                    )
+            st.markdown(
+                "<div style='display:grid;grid-template-columns:repeat(7,1fr);gap:4px'>" + "".join(cells) + "</div>",
+                unsafe_allow_html=True
+            )
+
+            # --- Day selection ---
+            month_dates = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+            selected_date = st.selectbox(
+                "Jump to day", month_dates, index=None, placeholder="Choose a day",
+                format_func=lambda d: f"{d:%d %b} (📦 {day_summary.get(d, {}).get('count', 0)})"
+            )
 
             # --- Display orders for selected date ---
-            if st.session_state["selected_date"]:
-                filtered = orders[orders["due_date"] == st.session_state["selected_date"]]
+            if selected_date:
+                filtered = day_groups.get(selected_date, orders.iloc[0:0])
                 with st.expander(
-                    f"📋 Orders for {st.session_state['selected_date']} ({len(filtered)})", expanded=True
+                    f"📋 Orders for {selected_date} ({len(filtered)})", expanded=True
                 ):
                     if filtered.empty:
                         st.info("No orders for this date.")
@@ -512,36 +660,20 @@ elif page == "Calendar":
 elif page == "Dashboard":
     st.header("📈 Business Performance Dashboard")
 
-    payments = load_data("payments")
-    costs = load_data("costs")
+    sheets = load_all()
+    payments, costs = sheets["payments"], sheets["costs"]
+    monthly_rev, monthly_cost = load_monthly_totals()
 
     # --- Monthly Revenue Trend ---
     if not payments.empty:
-        payments["payment_date"] = pd.to_datetime(payments["payment_date"], errors="coerce")
-        monthly_revenue = payments.groupby(payments["payment_date"].dt.to_period("M"))["amount_paid"].sum().reset_index()
-        monthly_revenue["payment_date"] = monthly_revenue["payment_date"].dt.to_timestamp()
-
         st.subheader("📆 Monthly Revenue Trend")
-        fig, ax = plt.subplots()
-        ax.plot(monthly_revenue["payment_date"], monthly_revenue["amount_paid"], color="#1976d2", marker="o")
-        ax.set_title("Revenue Over Time")
-        ax.set_ylabel("Amount (FCFA)")
-        ax.grid(True, linestyle='--', alpha=0.5)
-        st.pyplot(fig)
+        st.line_chart(monthly_rev.to_timestamp(), y_label="Amount (FCFA)", color="#1976d2")
     else:
         st.info("No payment data available.")
 
     # --- Monthly Profit Trend ---
     if not payments.empty and not costs.empty:
-        payments["payment_date"] = pd.to_datetime(payments["payment_date"], errors="coerce")
-        costs["date_incurred"] = pd.to_datetime(costs["date_incurred"], errors="coerce")
-
-        monthly_rev = payments.groupby(payments["payment_date"].dt.to_period("M"))["amount_paid"].sum()
-        monthly_cost = costs.groupby(costs["date_incurred"].dt.to_period("M"))["amount"].sum()
-        profit_df = pd.DataFrame({
-            "Revenue": monthly_rev,
-            "Costs": monthly_cost
-        }).fillna(0)
+        profit_df = pd.concat([monthly_rev.rename("Revenue"), monthly_cost.rename("Costs")], axis=1, sort=True).fillna(0)
         profit_df["Profit"] = profit_df["Revenue"] - profit_df["Costs"]
         profit_df.index = profit_df.index.to_timestamp()
 
@@ -560,14 +692,8 @@ elif page == "Dashboard":
         colC.metric("Total Months Tracked", len(profit_df))
 
         st.subheader("📊 Revenue vs Cost vs Profit")
-        fig2, ax2 = plt.subplots()
-        ax2.plot(profit_df.index, profit_df["Revenue"], label="Revenue", color="#4caf50", marker="o")
-        ax2.plot(profit_df.index, profit_df["Costs"], label="Costs", color="#f44336", marker="o")
-        ax2.plot(profit_df.index, profit_df["Profit"], label="Profit", color="#1976d2", marker="o")
-        ax2.set_title("Monthly Financial Performance")
-        ax2.legend()
-        ax2.grid(True, linestyle='--', alpha=0.5)
-        st.pyplot(fig2)
+        st.line_chart(profit_df[["Revenue", "Costs", "Profit"]],
+                      color=["#4caf50", "#f44336", "#1976d2"])
 
     # --- Expense Breakdown ---
     if not costs.empty: